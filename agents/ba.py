@@ -1,4 +1,4 @@
-def ba_step(state: dict) -> dict:
+async def ba_step(state: dict, tools=None) -> dict:
     # Minimal PRD text; in real use, call your LLM client here.
     prd = f"""# PRD for {state['ticket']}
 
@@ -20,5 +20,5 @@ Provide a simple HTTP API endpoint to demonstrate the multi-agent workflow.
 """
     state["prd"] = prd
     state["status"] = "needs_implementation"
-    state.setdefault("notes", []).append("BA: PRD drafted.")
+    state["notes"].append("BA: PRD drafted.")
     return state
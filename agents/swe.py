@@ -1,9 +1,7 @@
+import base64
 from pathlib import Path
 
-def swe_step(state: dict, tools):
-    # Write minimal FastAPI app + tests using MCP fs.write
-    app_py = r'''
-from fastapi import FastAPI
+_APP_PY = b'''from fastapi import FastAPI
 app = FastAPI()
 
 @app.get("/health")
@@ -13,10 +11,9 @@ def health():
 @app.get("/hello")
 def hello(name: str = "World"):
     return {"message": f"Hello, {name}!"}
-'''.lstrip()
+'''
 
-    test_py = r'''
-from fastapi.testclient import TestClient
+_TEST_PY = b'''from fastapi.testclient import TestClient
 from src.app import app
 
 client = TestClient(app)
@@ -35,16 +32,23 @@ def test_hello_name():
     r = client.get("/hello", params={"name":"Hugh"})
     assert r.status_code == 200
     assert r.json()["message"] == "Hello, Hugh!"
-'''.lstrip()
+'''
 
-    readme = "# Sample app\\n\\nRun: `uvicorn src.app:app --reload`\\n"
+_README = b"# Sample app\\n\\nRun: `uvicorn src.app:app --reload`\\n"
 
-    # Use MCP tool to write files
-    tools("fs.write", {"path":"src/app.py","content":app_py})
-    tools("fs.write", {"path":"tests/test_app.py","content":test_py})
-    tools("fs.write", {"path":"docs/PRD.md","content":state.get("prd","")})
-    tools("fs.write", {"path":"README.md","content":readme})
+# Static files are encoded once at import and sent as content_b64 on every run
+_STATIC_FILES = [
+    {"path": path, "content_b64": base64.b64encode(data).decode("ascii")}
+    for path, data in (("src/app.py", _APP_PY), ("tests/test_app.py", _TEST_PY), ("README.md", _README))
+]
+
+async def swe_step(state: dict, tools):
+    # Write minimal FastAPI app + tests using one MCP fs.write_many call
+    await tools("fs.write_many", {"files":[
+        *_STATIC_FILES,
+        {"path":"docs/PRD.md","content":state.get("prd","")},
+    ]})
 
     state["status"] = "testing"
-    state.setdefault("notes", []).append("SWE: code and tests written.")
+    state["notes"].append("SWE: code and tests written.")
     return state
@@ -1,15 +1,49 @@
+import base64
+import binascii
+import contextlib
+import hashlib
+import io
+import json
+import multiprocessing as mp
 import os
+import shlex
 import subprocess
+import sys
+import threading
+from collections import deque
+from functools import lru_cache
+from importlib.metadata import entry_points
 from pathlib import Path
 
+import httpx
+import orjson
+import pygit2
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from dotenv import load_dotenv
 
 load_dotenv()
 
-app = FastAPI()
+class OrjsonResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content)
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    global _pytest_pool
+    yield
+    # close pooled HTTP/2 connections to GitHub
+    await GITHUB.aclose()
+    # join and drop the pool so its semaphores are released before exit
+    if _pytest_pool is not None:
+        _pytest_pool.terminate()
+        _pytest_pool.join()
+        _pytest_pool = None
+
+app = FastAPI(lifespan=lifespan)
 
 # allow-all CORS (ok here; sensitive ops are gated by GH token on tool)
 app.add_middleware(
@@ -21,29 +55,190 @@ app.add_middleware(
 
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
 
+async def read_json(request: Request):
+    return orjson.loads(await request.body())
+
+# only the tail of a command's output is kept (coverage runs can be huge)
+OUTPUT_LIMIT = 1024 * 1024
+READ_CHUNK = 64 * 1024
+
+def drain(stream, buf: deque):
+    size = 0
+    for chunk in iter(lambda: stream.read1(READ_CHUNK), b""):
+        buf.append(chunk)
+        size += len(chunk)
+        while size > OUTPUT_LIMIT and len(buf) > 1:
+            size -= len(buf.popleft())
+    stream.close()
+
+def tail_text(buf: deque) -> str:
+    return b"".join(buf)[-OUTPUT_LIMIT:].decode("utf-8", "replace")
+
+class TailWriter(io.TextIOBase):
+    # text sink for redirected in-process output; holds at most the last OUTPUT_LIMIT chars
+    def __init__(self):
+        self.parts = deque()
+        self.size = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, s: str) -> int:
+        self.parts.append(s)
+        self.size += len(s)
+        while self.size - len(self.parts[0]) >= OUTPUT_LIMIT:
+            self.size -= len(self.parts.popleft())
+        if self.size > OUTPUT_LIMIT:
+            self.parts[0] = self.parts[0][self.size - OUTPUT_LIMIT:]
+            self.size = OUTPUT_LIMIT
+        return len(s)
+
+    def getvalue(self) -> str:
+        return "".join(self.parts)
+
 def run(cmd, cwd=None):
+    proc = subprocess.Popen(
+        cmd, cwd=cwd or PROJECT_ROOT, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    out, err = deque(), deque()
+    readers = [
+        threading.Thread(target=drain, args=(proc.stdout, out), daemon=True),
+        threading.Thread(target=drain, args=(proc.stderr, err), daemon=True),
+    ]
+    for t in readers:
+        t.start()
+    returncode = proc.wait()
+    for t in readers:
+        t.join()
+    if returncode == 0:
+        return {"ok": True, "stdout": tail_text(out), "stderr": tail_text(err)}
+    return {"ok": False, "stdout": tail_text(out), "stderr": tail_text(err), "returncode": returncode}
+
+def run_pytest_in_worker(args):
+    # executes in a forkserver child that already has pytest and its plugins imported
+    import pytest
+    os.chdir(PROJECT_ROOT)
+    sys.path.insert(0, str(PROJECT_ROOT))
+    out, err = TailWriter(), TailWriter()
+    with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+        rc = int(pytest.main(list(args)))
+    return {"ok": rc == 0, "stdout": out.getvalue(), "stderr": err.getvalue(), "returncode": rc}
+
+_pytest_pool = None
+_pytest_pool_lock = threading.Lock()
+
+def pytest_pool():
+    global _pytest_pool
+    with _pytest_pool_lock:
+        if _pytest_pool is None:
+            # the forkserver is a fresh single-threaded process that imports this module,
+            # pytest and its plugins once; workers forked from it start warm. One task
+            # per worker keeps project modules fresh between runs while the pool forks
+            # the next worker in the background.
+            ctx = mp.get_context("forkserver")
+            plugins = sorted({ep.module for ep in entry_points(group="pytest11")})
+            ctx.set_forkserver_preload([__name__, "pytest", *plugins])
+            _pytest_pool = ctx.Pool(1, maxtasksperchild=1)
+        return _pytest_pool
+
+def run_pytest(args) -> dict:
+    if "forkserver" not in mp.get_all_start_methods():
+        # python -m pytest puts the project root on sys.path, as the worker does
+        return run([sys.executable, "-m", "pytest"] + args, cwd=PROJECT_ROOT)
+    return pytest_pool().apply(run_pytest_in_worker, (args,))
+
+_repo = None
+
+def git_repo() -> pygit2.Repository:
+    # opened once; branch/commit run in-process instead of forking git
+    global _repo
+    if _repo is None:
+        _repo = pygit2.Repository(str(PROJECT_ROOT))
+    return _repo
+
+def git_checkout_branch(name: str) -> dict:
+    try:
+        repo = git_repo()
+        # same as `git checkout -B`: (re)point the branch at HEAD and switch to it
+        if repo.head_is_detached or repo.head.shorthand != name:
+            repo.branches.local.create(name, repo.head.peel(pygit2.Commit), force=True)
+            repo.checkout(f"refs/heads/{name}")
+        return {"ok": True, "branch": name}
+    except pygit2.GitError as e:
+        return {"ok": False, "error": str(e)}
+
+def git_commit_all(message: str) -> dict:
     try:
-        res = subprocess.run(
-            cmd, cwd=cwd or PROJECT_ROOT, capture_output=True, text=True, check=True
-        )
-        return {"ok": True, "stdout": res.stdout, "stderr": res.stderr}
-    except subprocess.CalledProcessError as e:
-        return {"ok": False, "stdout": e.stdout, "stderr": e.stderr, "returncode": e.returncode}
+        repo = git_repo()
+        index = repo.index
+        index.read()
+        index.add_all()  # like `git add -A`, also drops files deleted on disk
+        index.write()
+        tree = index.write_tree()
+        parents = [] if repo.head_is_unborn else [repo.head.target]
+        if parents and repo[parents[0]].tree_id == tree:
+            return {"ok": False, "error": "nothing_to_commit"}
+        sig = repo.default_signature
+        oid = repo.create_commit("HEAD", sig, sig, message, tree, parents)
+        return {"ok": True, "commit": str(oid)}
+    except (pygit2.GitError, KeyError) as e:
+        return {"ok": False, "error": str(e)}
 
 def ensure_parent(path: Path):
     path.parent.mkdir(parents=True, exist_ok=True)
 
+# small files are cached by (path, mtime, size), so any rewrite invalidates the entry
+READ_CACHE_MAX_BYTES = 256 * 1024
+
+@lru_cache(maxsize=256)
+def cached_read(path_str: str, mtime_ns: int, size: int) -> str:
+    return Path(path_str).read_text(encoding="utf-8")
+
+def read_text(path: Path) -> str:
+    st = os.stat(path)
+    if st.st_size > READ_CACHE_MAX_BYTES:
+        return path.read_text(encoding="utf-8")
+    return cached_read(str(path), st.st_mtime_ns, st.st_size)
+
+# MCP_FSYNC=1 makes each write durable via O_DSYNC instead of a separate fdatasync
+WRITE_FLAGS = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0)
+if os.getenv("MCP_FSYNC") == "1":
+    WRITE_FLAGS |= getattr(os, "O_DSYNC", 0)
+
+def write_bytes(path: Path, data: bytes):
+    fd = os.open(str(path), WRITE_FLAGS, 0o644)
+    try:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
+
+# resolved once at import; callers pass already-resolved paths
+ALLOWED_PREFIXES = tuple(
+    str((PROJECT_ROOT / d).resolve()) + os.sep for d in ("src", "tests", "docs")
+)
+
 def allowed_path(p: Path) -> bool:
-    allowed_roots = [PROJECT_ROOT / "src", PROJECT_ROOT / "tests", PROJECT_ROOT / "docs"]
-    rp = p.resolve()
-    for root in allowed_roots:
+    return str(p).startswith(ALLOWED_PREFIXES)
+
+def write_file(entry: dict) -> dict:
+    path = (PROJECT_ROOT / entry["path"]).resolve()
+    if not allowed_path(path):
+        return {"ok": False, "error": "write_not_allowed", "path": str(path)}
+    # content_b64 carries bytes the client already has encoded
+    if "content_b64" in entry:
         try:
-            if rp.is_relative_to(root.resolve()):
-                return True
-        except AttributeError:
-            if str(rp).startswith(str(root.resolve())):
-                return True
-    return False
+            data = base64.b64decode(entry["content_b64"], validate=True)
+        except binascii.Error:
+            return {"ok": False, "error": "bad_base64", "path": str(path)}
+    elif "content" in entry:
+        data = entry["content"].encode("utf-8")
+    else:
+        return {"ok": False, "error": "missing_content", "path": str(path)}
+    ensure_parent(path)
+    write_bytes(path, data)
+    return {"ok": True}
 
 MANIFEST_BODY = {
     "name": "codex-mcp",
@@ -60,11 +255,42 @@ MANIFEST_BODY = {
         },
         {
             "name": "fs.write",
-            "description": "Write UTF-8 text file (allow-listed paths only)",
+            "description": "Write UTF-8 text (content) or base64 bytes (content_b64) (allow-listed paths only)",
             "input_schema": {
                 "type": "object",
-                "properties": {"path": {"type": "string"}, "content": {"type": "string"}},
-                "required": ["path", "content"],
+                "properties": {
+                    "path": {"type": "string"},
+                    "content": {"type": "string"},
+                    "content_b64": {"type": "string"},
+                },
+                "required": ["path"],
+                "anyOf": [{"required": ["content"]}, {"required": ["content_b64"]}],
+            },
+        },
+        {
+            "name": "fs.write_many",
+            "description": "Write several files in one call, as content or content_b64 (allow-listed paths only)",
+            "input_schema": {
+                "type": "object",
+                "properties": {
+                    "files": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "path": {"type": "string"},
+                                "content": {"type": "string"},
+                                "content_b64": {"type": "string"},
+                            },
+                            "required": ["path"],
+                            "anyOf": [
+                                {"required": ["content"]},
+                                {"required": ["content_b64"]},
+                            ],
+                        },
+                    }
+                },
+                "required": ["files"],
             },
         },
         {
@@ -116,6 +342,19 @@ MANIFEST_BODY = {
                 },
             },
         },
+        {
+            "name": "git.commit_push",
+            "description": "Create/switch branch, commit all changes and push, in one step",
+            "input_schema": {
+                "type": "object",
+                "properties": {
+                    "branch": {"type": "string"},
+                    "message": {"type": "string"},
+                    "remote": {"type": "string", "default": "origin"},
+                },
+                "required": ["branch", "message"],
+            },
+        },
         {
             "name": "github.create_pr",
             "description": "Open a PR in GitHub (requires env vars)",
@@ -148,10 +387,20 @@ MANIFEST_BODY = {
     ],
 }
 
+# the manifest is static: serialize it once and let clients revalidate by ETag
+MANIFEST_BYTES = json.dumps(MANIFEST_BODY, separators=(",", ":")).encode()
+MANIFEST_ETAG = f'"{hashlib.md5(MANIFEST_BYTES).hexdigest()}"'
+
+def manifest_response(request: Request) -> Response:
+    headers = {"ETag": MANIFEST_ETAG, "Cache-Control": "public, max-age=300"}
+    if MANIFEST_ETAG in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return Response(content=MANIFEST_BYTES, media_type="application/json", headers=headers)
+
 # allow GET and POST (some clients probe POST)
 @app.api_route("/.well-known/manifest.json", methods=["GET", "POST"])
-def manifest():
-    return JSONResponse(MANIFEST_BODY)
+def manifest(request: Request):
+    return manifest_response(request)
 
 # health
 @app.get("/")
@@ -161,29 +410,30 @@ def root_ok():
 # tools
 @app.post("/tools/fs.read")
 async def fs_read(request: Request):
-    data = await request.json()
+    data = await read_json(request)
     path = (PROJECT_ROOT / data["path"]).resolve()
-    if not path.exists():
-        return JSONResponse({"ok": False, "error": "not_found", "path": str(path)})
     try:
-        content = path.read_text(encoding="utf-8")
+        content = read_text(path)
+    except FileNotFoundError:
+        return OrjsonResponse({"ok": False, "error": "not_found", "path": str(path)})
     except UnicodeDecodeError:
-        return JSONResponse({"ok": False, "error": "not_utf8", "path": str(path)})
-    return JSONResponse({"ok": True, "content": content})
+        return OrjsonResponse({"ok": False, "error": "not_utf8", "path": str(path)})
+    return OrjsonResponse({"ok": True, "content": content})
 
 @app.post("/tools/fs.write")
 async def fs_write(request: Request):
-    data = await request.json()
-    path = (PROJECT_ROOT / data["path"]).resolve()
-    if not allowed_path(path):
-        return JSONResponse({"ok": False, "error": "write_not_allowed", "path": str(path)})
-    ensure_parent(path)
-    path.write_text(data["content"], encoding="utf-8")
-    return JSONResponse({"ok": True})
+    data = await read_json(request)
+    return OrjsonResponse(write_file(data))
+
+@app.post("/tools/fs.write_many")
+async def fs_write_many(request: Request):
+    data = await read_json(request)
+    results = [write_file(f) for f in data["files"]]
+    return OrjsonResponse({"ok": all(r["ok"] for r in results), "results": results})
 
 @app.post("/tools/tests.pytest")
 async def tests_pytest(request: Request):
-    data = await request.json()
+    data = await read_json(request)
     args = data.get("args") or [
         "-q",
         "--maxfail=1",
@@ -191,27 +441,22 @@ async def tests_pytest(request: Request):
         "--cov=src",
         "--cov-report=term-missing",
     ]
-    result = run(["pytest"] + args, cwd=PROJECT_ROOT)
-    return JSONResponse(result)
+    result = run_pytest(args)
+    return OrjsonResponse(result)
 
 @app.post("/tools/git.branch")
 async def git_branch(request: Request):
-    data = await request.json()
-    name = data["name"]
-    result = run(["git", "checkout", "-B", name], cwd=PROJECT_ROOT)
-    return JSONResponse(result)
+    data = await read_json(request)
+    return OrjsonResponse(git_checkout_branch(data["name"]))
 
 @app.post("/tools/git.commit")
 async def git_commit(request: Request):
-    data = await request.json()
-    msg = data["message"]
-    run(["git", "add", "-A"], cwd=PROJECT_ROOT)
-    result = run(["git", "commit", "-m", msg], cwd=PROJECT_ROOT)
-    return JSONResponse(result)
+    data = await read_json(request)
+    return OrjsonResponse(git_commit_all(data["message"]))
 
 @app.post("/tools/git.push")
 async def git_push(request: Request):
-    data = await request.json()
+    data = await read_json(request)
     remote = data.get("remote", "origin")
     set_upstream = data.get("set_upstream", True)
     args = ["git", "push"]
@@ -220,12 +465,33 @@ async def git_push(request: Request):
     else:
         args += [remote, "HEAD"]
     result = run(args, cwd=PROJECT_ROOT)
-    return JSONResponse(result)
+    return OrjsonResponse(result)
+
+@app.post("/tools/git.commit_push")
+async def git_commit_push(request: Request):
+    data = await read_json(request)
+    # one shell process for the whole sequence instead of one git fork per step
+    branch = shlex.quote(data["branch"])
+    message = shlex.quote(data["message"])
+    remote = shlex.quote(data.get("remote", "origin"))
+    script = (
+        f"git checkout -B {branch} && git add -A"
+        f" && git commit -m {message} && git push -u {remote} HEAD"
+    )
+    result = run(["bash", "-c", script], cwd=PROJECT_ROOT)
+    return OrjsonResponse(result)
+
+# one HTTP/2 client for all GitHub API calls, so PR creation and CI polling share a connection
+GITHUB = httpx.AsyncClient(
+    base_url="https://api.github.com",
+    http2=True,
+    timeout=30,
+    headers={"Accept": "application/vnd.github+json"},
+)
 
 @app.post("/tools/github.create_pr")
 async def github_create_pr(request: Request):
-    import requests
-    data = await request.json()
+    data = await read_json(request)
     owner = data["owner"]
     repo = data["repo"]
     head = data["head"]
@@ -234,24 +500,26 @@ async def github_create_pr(request: Request):
     body = data.get("body", "")
     token = os.getenv("GITHUB_TOKEN")
     if not token:
-        return JSONResponse({"ok": False, "error": "missing_GITHUB_TOKEN_env"})
-    url = f"https://api.github.com/repos/{owner}/{repo}/pulls"
-    headers = {"Authorization": f"Bearer {token}", "Accept": "application/vnd.github+json"}
-    resp = requests.post(url, headers=headers, json={"title": title, "head": head, "base": base, "body": body})
+        return OrjsonResponse({"ok": False, "error": "missing_GITHUB_TOKEN_env"})
+    resp = await GITHUB.post(
+        f"/repos/{owner}/{repo}/pulls",
+        headers={"Authorization": f"Bearer {token}"},
+        json={"title": title, "head": head, "base": base, "body": body},
+    )
     if resp.status_code >= 400:
-        return JSONResponse({"ok": False, "status": resp.status_code, "resp": resp.text})
+        return OrjsonResponse({"ok": False, "status": resp.status_code, "resp": resp.text})
     pr = resp.json()
-    return JSONResponse({"ok": True, "number": pr.get("number"), "url": pr.get("html_url")})
+    return OrjsonResponse({"ok": True, "number": pr.get("number"), "url": pr.get("html_url")})
 
 @app.post("/tools/checks.wait_for_ci")
 async def checks_wait_for_ci(request: Request):
-    data = await request.json()
-    return JSONResponse({"completed": True, "success": True})
+    data = await read_json(request)
+    return OrjsonResponse({"completed": True, "success": True})
 
 # allow GET, POST, HEAD, OPTIONS (Claude probes POST/HEAD/OPTIONS)
 @app.api_route("/.well-known/manifest.json", methods=["GET", "POST", "HEAD", "OPTIONS"])
-def manifest():
-    return JSONResponse(MANIFEST_BODY)
+def manifest(request: Request):
+    return manifest_response(request)
 
 # explicit OPTIONS handler (some clients want a 200/204 preflight)
 @app.options("/.well-known/manifest.json")
@@ -306,8 +574,6 @@ def oauth_dynamic_client_register():
     # Pretend DCR succeeded; not used in authless mode
     return JSONResponse({"client_id": "dummy", "client_secret": "dummy"}, status_code=200)
 
-from fastapi import Response
-
 # Health on root (GET + explicit HEAD)
 @app.get("/")
 def root_ok():
@@ -320,8 +586,8 @@ def root_head():
 
 # Manifest: allow GET/POST/HEAD/OPTIONS explicitly
 @app.api_route("/.well-known/manifest.json", methods=["GET", "POST", "HEAD", "OPTIONS"])
-def manifest():
-    return JSONResponse(MANIFEST_BODY)
+def manifest(request: Request):
+    return manifest_response(request)
 
 @app.options("/.well-known/manifest.json")
 def manifest_options():
@@ -331,5 +597,10 @@ if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", "3333"))
     host = os.getenv("HOST", "0.0.0.0")
+    try:
+        import uvloop  # noqa: F401  (no Windows support)
+        loop = "uvloop"
+    except ImportError:
+        loop = "asyncio"
     print(f"Project root: {PROJECT_ROOT}")
-    uvicorn.run(app, host=host, port=port)
+    uvicorn.run(app, host=host, port=port, loop=loop, http="httptools", log_level="warning")
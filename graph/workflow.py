@@ -1,4 +1,8 @@
-import json, requests
+import json
+from functools import partial
+
+import httpx
+import orjson
 
 from agents.pm import pm_step
 from agents.ba import ba_step
@@ -6,17 +10,17 @@ from agents.swe import swe_step
 from agents.qa import qa_step
 
 MCP_URL = "http://127.0.0.1:3333"
+MCP_LIMITS = httpx.Limits(max_connections=8, max_keepalive_connections=4)
 
-def call_tool(tool_name: str, payload: dict):
-    # Generic MCP client
-    resp = requests.post(f"{MCP_URL}/tools/{tool_name}", json=payload, timeout=60)
-    try:
-        return resp.json()
-    except Exception:
-        return {"ok": False, "error": f"bad_response_{resp.status_code}", "text": resp.text}
+async def call_tool(client: httpx.AsyncClient, tool_name: str, payload: dict):
+    # Generic MCP client; `client` keeps connections alive across tool calls
+    resp = await client.post(f"/tools/{tool_name}", json=payload)
+    if resp.headers.get("content-type", "").startswith("application/json"):
+        return orjson.loads(resp.content)
+    return {"ok": False, "error": f"bad_response_{resp.status_code}", "status": resp.status_code, "text": resp.text}
 
 def supervisor(state: dict) -> str:
-    s = state.get("status","new")
+    s = state["status"]
     if s in ("new","planned"): return "pm"
     if s == "needs_prd": return "ba"
     if s == "needs_implementation": return "swe"
@@ -25,38 +29,40 @@ def supervisor(state: dict) -> str:
     if s == "ready_for_pr": return "repoops"
     return "done"
 
-def repoops_step(state: dict):
-    # Create branch, commit, push, and open PR using MCP tools.
+async def repoops_step(state: dict, tools):
+    # Create branch, commit and push in one MCP call, then open the PR.
     ticket = state.get("ticket","MVP-001")
     branch = f"feat/{ticket.lower()}"
-    call_tool("git.branch", {"name": branch})
-    call_tool("git.commit", {"message": f"{ticket}: sample feature implementation"})
-    call_tool("git.push", {"set_upstream": True})
+    await tools("git.commit_push", {"branch": branch, "message": f"{ticket}: sample feature implementation"})
 
     owner = state.get("github_owner") or "your-user"
     repo = state.get("github_repo") or "your-repo"
     pr_title = f"{ticket}: Sample feature"
     pr_body = "Auto-generated PR by codex-multiagent."
-    pr = call_tool("github.create_pr", {"owner": owner, "repo": repo, "head": branch, "base": "main", "title": pr_title, "body": pr_body})
+    pr = await tools("github.create_pr", {"owner": owner, "repo": repo, "head": branch, "base": "main", "title": pr_title, "body": pr_body})
     state["pr_response"] = pr
     state["status"] = "done"
-    state.setdefault("notes", []).append("RepoOps: PR opened." if pr.get("ok") else "RepoOps: PR failed; check creds.")
+    state["notes"].append("RepoOps: PR opened." if pr.get("ok") else "RepoOps: PR failed; check creds.")
     return state
 
-def run(state: dict) -> dict:
-    # Simple state machine loop
-    for _ in range(20):
-        nxt = supervisor(state)
-        if nxt == "pm":
-            state = pm_step(state)
-        elif nxt == "ba":
-            state = ba_step(state)
-        elif nxt == "swe":
-            state = swe_step(state, call_tool)
-        elif nxt == "qa":
-            state = qa_step(state, call_tool)
-        elif nxt == "repoops":
-            state = repoops_step(state)
-        else:
-            break
+STEPS = {
+    "pm": pm_step,
+    "ba": ba_step,
+    "swe": swe_step,
+    "qa": qa_step,
+    "repoops": repoops_step,
+}
+
+async def run(state: dict) -> dict:
+    # Simple state machine loop; all tool calls share one pooled client
+    async with httpx.AsyncClient(base_url=MCP_URL, timeout=60, limits=MCP_LIMITS) as client:
+        tools = partial(call_tool, client)
+        # steps append to notes and read status directly
+        state.setdefault("notes", [])
+        state.setdefault("status", "new")
+        for _ in range(20):
+            nxt = supervisor(state)
+            if nxt == "done":
+                break
+            state = await STEPS[nxt](state, tools)
     return state
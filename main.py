@@ -1,3 +1,5 @@
+import asyncio
+
 from graph.workflow import run
 
 if __name__ == "__main__":
@@ -9,7 +11,7 @@ if __name__ == "__main__":
         # "github_owner": "your-user-or-org",
         # "github_repo":  "your-repo-name",
     }
-    final_state = run(state)
+    final_state = asyncio.run(run(state))
     print("Status:", final_state.get("status"))
     print("Notes:", *final_state.get("notes", []), sep="\n - ")
     if "pr_response" in final_state:
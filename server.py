@@ -1,39 +1,185 @@
 
-import os, subprocess
+import asyncio, base64, binascii, contextlib, hashlib, inspect, io, json, os, shlex, subprocess, sys, threading
+from collections import deque
+from functools import lru_cache, partial
+import multiprocessing as mp
+from importlib.metadata import entry_points
 from pathlib import Path
 from typing import Any, Dict
 
+import httpx
+import orjson
+import pygit2
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse, Response
 from dotenv import load_dotenv
 
 load_dotenv()
-app = FastAPI()
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    global _pytest_pool
+    yield
+    # close pooled HTTP/2 connections to GitHub
+    await GITHUB.aclose()
+    # join and drop the pool so its semaphores are released before exit
+    if _pytest_pool is not None:
+        _pytest_pool.terminate(); _pytest_pool.join(); _pytest_pool = None
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
 
 PROJECT_ROOT = Path(__file__).resolve().parent
 
+class OrjsonResponse(Response):
+    media_type = "application/json"
+    def render(self, content) -> bytes: return orjson.dumps(content)
+
+# only the tail of a command's output is kept (coverage runs can be huge)
+OUTPUT_LIMIT = 1024 * 1024
+READ_CHUNK = 64 * 1024
+
+def drain(stream, buf: deque):
+    size = 0
+    for chunk in iter(lambda: stream.read1(READ_CHUNK), b""):
+        buf.append(chunk); size += len(chunk)
+        while size > OUTPUT_LIMIT and len(buf) > 1: size -= len(buf.popleft())
+    stream.close()
+
+def tail_text(buf: deque) -> str: return b"".join(buf)[-OUTPUT_LIMIT:].decode("utf-8", "replace")
+
+class TailWriter(io.TextIOBase):
+    # text sink for redirected in-process output; holds at most the last OUTPUT_LIMIT chars
+    def __init__(self): self.parts, self.size = deque(), 0
+    def writable(self) -> bool: return True
+    def write(self, s: str) -> int:
+        self.parts.append(s); self.size += len(s)
+        while self.size - len(self.parts[0]) >= OUTPUT_LIMIT: self.size -= len(self.parts.popleft())
+        if self.size > OUTPUT_LIMIT: self.parts[0] = self.parts[0][self.size - OUTPUT_LIMIT:]; self.size = OUTPUT_LIMIT
+        return len(s)
+    def getvalue(self) -> str: return "".join(self.parts)
+
 def run(cmd: list[str], cwd: Path | None = None) -> dict:
+    proc = subprocess.Popen(cmd, cwd=cwd or PROJECT_ROOT, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    out, err = deque(), deque()
+    readers = [threading.Thread(target=drain, args=(s, b), daemon=True) for s, b in ((proc.stdout, out), (proc.stderr, err))]
+    for t in readers: t.start()
+    returncode = proc.wait()
+    for t in readers: t.join()
+    if returncode == 0:
+        return {"ok": True, "stdout": tail_text(out), "stderr": tail_text(err)}
+    return {"ok": False, "stdout": tail_text(out), "stderr": tail_text(err), "returncode": returncode}
+
+def run_pytest_in_worker(args):
+    # executes in a forkserver child that already has pytest and its plugins imported
+    import pytest
+    os.chdir(PROJECT_ROOT)
+    sys.path.insert(0, str(PROJECT_ROOT))
+    out, err = TailWriter(), TailWriter()
+    with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+        rc = int(pytest.main(list(args)))
+    return {"ok": rc == 0, "stdout": out.getvalue(), "stderr": err.getvalue(), "returncode": rc}
+
+_pytest_pool = None
+_pytest_pool_lock = threading.Lock()
+
+def pytest_pool():
+    global _pytest_pool
+    with _pytest_pool_lock:
+        if _pytest_pool is None:
+            # the forkserver is a fresh single-threaded process that imports this module,
+            # pytest and its plugins once; workers forked from it start warm. One task
+            # per worker keeps project modules fresh between runs while the pool forks
+            # the next worker in the background.
+            ctx = mp.get_context("forkserver")
+            plugins = sorted({ep.module for ep in entry_points(group="pytest11")})
+            ctx.set_forkserver_preload([__name__, "pytest", *plugins])
+            _pytest_pool = ctx.Pool(1, maxtasksperchild=1)
+        return _pytest_pool
+
+def run_pytest(args) -> dict:
+    if "forkserver" not in mp.get_all_start_methods():
+        # python -m pytest puts the project root on sys.path, as the worker does
+        return run([sys.executable, "-m", "pytest"] + args, cwd=PROJECT_ROOT)
+    return pytest_pool().apply(run_pytest_in_worker, (args,))
+
+_repo = None
+
+def git_repo() -> pygit2.Repository:
+    # opened once; branch/commit run in-process instead of forking git
+    global _repo
+    if _repo is None: _repo = pygit2.Repository(str(PROJECT_ROOT))
+    return _repo
+
+def git_checkout_branch(name: str) -> dict:
     try:
-        res = subprocess.run(cmd, cwd=cwd or PROJECT_ROOT, capture_output=True, text=True, check=True)
-        return {"ok": True, "stdout": res.stdout, "stderr": res.stderr}
-    except subprocess.CalledProcessError as e:
-        return {"ok": False, "stdout": e.stdout, "stderr": e.stderr, "returncode": e.returncode}
+        repo = git_repo()
+        # same as `git checkout -B`: (re)point the branch at HEAD and switch to it
+        if repo.head_is_detached or repo.head.shorthand != name:
+            repo.branches.local.create(name, repo.head.peel(pygit2.Commit), force=True)
+            repo.checkout(f"refs/heads/{name}")
+        return {"ok": True, "branch": name}
+    except pygit2.GitError as e:
+        return {"ok": False, "error": str(e)}
+
+def git_commit_all(message: str) -> dict:
+    try:
+        repo = git_repo()
+        index = repo.index
+        index.read()
+        index.add_all()  # like `git add -A`, also drops files deleted on disk
+        index.write()
+        tree = index.write_tree()
+        parents = [] if repo.head_is_unborn else [repo.head.target]
+        if parents and repo[parents[0]].tree_id == tree:
+            return {"ok": False, "error": "nothing_to_commit"}
+        sig = repo.default_signature
+        oid = repo.create_commit("HEAD", sig, sig, message, tree, parents)
+        return {"ok": True, "commit": str(oid)}
+    except (pygit2.GitError, KeyError) as e:
+        return {"ok": False, "error": str(e)}
 
 def ensure_parent(path: Path): path.parent.mkdir(parents=True, exist_ok=True)
+
+# small files are cached by (path, mtime, size), so any rewrite invalidates the entry
+READ_CACHE_MAX_BYTES = 256 * 1024
+
+@lru_cache(maxsize=256)
+def cached_read(path_str: str, mtime_ns: int, size: int) -> str: return Path(path_str).read_text(encoding="utf-8")
+
+def read_text(p: Path) -> str:
+    st = os.stat(p)
+    if st.st_size > READ_CACHE_MAX_BYTES: return p.read_text(encoding="utf-8")
+    return cached_read(str(p), st.st_mtime_ns, st.st_size)
+
+# MCP_FSYNC=1 makes each write durable via O_DSYNC instead of a separate fdatasync
+WRITE_FLAGS = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0)
+if os.getenv("MCP_FSYNC") == "1": WRITE_FLAGS |= getattr(os, "O_DSYNC", 0)
+
+def write_bytes(path: Path, data: bytes):
+    fd = os.open(str(path), WRITE_FLAGS, 0o644)
+    try:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
+
+# resolved once; callers pass already-resolved paths
+ALLOWED_PREFIXES = tuple(str((PROJECT_ROOT / d).resolve()) + os.sep for d in ("src", "tests", "docs"))
 def allowed_path(p: Path) -> bool:
-    allowed = [PROJECT_ROOT / "src", PROJECT_ROOT / "tests", PROJECT_ROOT / "docs"]
-    rp = p.resolve()
-    return any(str(rp).startswith(str(a.resolve())) for a in allowed)
+    return str(p).startswith(ALLOWED_PREFIXES)
 
 TOOLS_SCHEMA = [
     {"name":"fs.read","input_schema":{"type":"object","properties":{"path":{"type":"string"}},"required":["path"]}},
-    {"name":"fs.write","input_schema":{"type":"object","properties":{"path":{"type":"string"},"content":{"type":"string"}},"required":["path","content"]}},
+    {"name":"fs.write","input_schema":{"type":"object","properties":{"path":{"type":"string"},"content":{"type":"string"},"content_b64":{"type":"string"}},"required":["path"],"anyOf":[{"required":["content"]},{"required":["content_b64"]}]}},
+    {"name":"fs.write_many","input_schema":{"type":"object","properties":{"files":{"type":"array","items":{"type":"object","properties":{"path":{"type":"string"},"content":{"type":"string"},"content_b64":{"type":"string"}},"required":["path"],"anyOf":[{"required":["content"]},{"required":["content_b64"]}]}}},"required":["files"]}},
     {"name":"tests.pytest","input_schema":{"type":"object","properties":{"args":{"type":"array","items":{"type":"string"}}}}},
     {"name":"git.branch","input_schema":{"type":"object","properties":{"name":{"type":"string"}},"required":["name"]}},
     {"name":"git.commit","input_schema":{"type":"object","properties":{"message":{"type":"string"}},"required":["message"]}},
     {"name":"git.push","input_schema":{"type":"object","properties":{"remote":{"type":"string"},"set_upstream":{"type":"boolean"}}}},
+    {"name":"git.commit_push","input_schema":{"type":"object","properties":{"branch":{"type":"string"},"message":{"type":"string"},"remote":{"type":"string"}},"required":["branch","message"]}},
     {"name":"github.create_pr","input_schema":{"type":"object","properties":{"owner":{"type":"string"},"repo":{"type":"string"},"head":{"type":"string"},"base":{"type":"string"},"title":{"type":"string"},"body":{"type":"string"}},"required":["owner","repo","head","base","title"]}},
     {"name":"checks.wait_for_ci","input_schema":{"type":"object","properties":{"owner":{"type":"string"},"repo":{"type":"string"},"pr_number":{"type":"integer"}},"required":["owner","repo","pr_number"]}}
 ]
@@ -50,6 +196,16 @@ MCP_MANIFEST = {
     ]
 }
 
+# the manifest is static: serialize it once and let clients revalidate by ETag
+MANIFEST_BYTES = json.dumps(MCP_MANIFEST, separators=(",",":")).encode()
+MANIFEST_ETAG = f'"{hashlib.md5(MANIFEST_BYTES).hexdigest()}"'
+
+def manifest_response(request: Request) -> Response:
+    headers = {"ETag": MANIFEST_ETAG, "Cache-Control": "public, max-age=300"}
+    if MANIFEST_ETAG in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return Response(content=MANIFEST_BYTES, media_type="application/json", headers=headers)
+
 @app.get("/")
 def root_ok():
     return {"ok": True}
@@ -59,12 +215,12 @@ def root_head():
     return Response(status_code=200)
 
 @app.api_route("/.well-known/mcp/manifest.json", methods=["GET","HEAD","OPTIONS"])
-def mcp_manifest():
-    return JSONResponse(MCP_MANIFEST)
+def mcp_manifest(request: Request):
+    return manifest_response(request)
 
 @app.api_route("/.well-known/manifest.json", methods=["GET","HEAD","OPTIONS"])
-def legacy_manifest():
-    return JSONResponse(MCP_MANIFEST)
+def legacy_manifest(request: Request):
+    return manifest_response(request)
 
 @app.get("/.well-known/oauth-authorization-server")
 def oauth_metadata():
@@ -87,48 +243,79 @@ def oauth_register():
 
 def tool_fs_read(args: Dict[str, Any]) -> Dict[str, Any]:
     p = (PROJECT_ROOT / args["path"]).resolve()
-    if not p.exists():
-        return {"ok": False, "error": "not_found", "path": str(p)}
     try:
-        return {"ok": True, "content": p.read_text(encoding="utf-8")}
+        return {"ok": True, "content": read_text(p)}
+    except FileNotFoundError:
+        return {"ok": False, "error": "not_found", "path": str(p)}
     except UnicodeDecodeError:
         return {"ok": False, "error": "not_utf8", "path": str(p)}
 
-def tool_fs_write(args: Dict[str, Any]) -> Dict[str, Any]:
+# per-resource concurrency caps: git ops contend on the .git index lock, file writes don't
+GIT_SEM = asyncio.Semaphore(1)
+FS_SEM = asyncio.Semaphore(8)
+
+def write_file(args: Dict[str, Any]) -> Dict[str, Any]:
     p = (PROJECT_ROOT / args["path"]).resolve()
     if not allowed_path(p):
         return {"ok": False, "error": "write_not_allowed", "path": str(p)}
+    # content_b64 carries bytes the client already has encoded
+    if "content_b64" not in args and "content" not in args:
+        return {"ok": False, "error": "missing_content", "path": str(p)}
+    try:
+        data = base64.b64decode(args["content_b64"], validate=True) if "content_b64" in args else args["content"].encode("utf-8")
+    except binascii.Error:
+        return {"ok": False, "error": "bad_base64", "path": str(p)}
     ensure_parent(p)
-    p.write_text(args["content"], encoding="utf-8")
+    write_bytes(p, data)
     return {"ok": True}
 
+async def tool_fs_write(args: Dict[str, Any]) -> Dict[str, Any]:
+    async with FS_SEM:
+        return await asyncio.to_thread(write_file, args)
+
+async def tool_fs_write_many(args: Dict[str, Any]) -> Dict[str, Any]:
+    # one thread, entries in order: a later entry for the same path wins, as in codex-mcp
+    async with FS_SEM:
+        results = await asyncio.to_thread(lambda: [write_file(f) for f in args["files"]])
+    return {"ok": all(r["ok"] for r in results), "results": results}
+
 def tool_tests_pytest(args: Dict[str, Any]) -> Dict[str, Any]:
     py_args = args.get("args") or ["-q","--maxfail=1","--disable-warnings","--cov=src","--cov-report=term-missing"]
-    return run(["pytest"] + py_args, cwd=PROJECT_ROOT)
+    return run_pytest(py_args)
 
-def tool_git_branch(args: Dict[str, Any]) -> Dict[str, Any]:
-    return run(["git","checkout","-B", args["name"]], cwd=PROJECT_ROOT)
+async def tool_git_branch(args: Dict[str, Any]) -> Dict[str, Any]:
+    async with GIT_SEM:
+        return await asyncio.to_thread(git_checkout_branch, args["name"])
 
-def tool_git_commit(args: Dict[str, Any]) -> Dict[str, Any]:
-    run(["git","add","-A"], cwd=PROJECT_ROOT)
-    return run(["git","commit","-m", args["message"]], cwd=PROJECT_ROOT)
+async def tool_git_commit(args: Dict[str, Any]) -> Dict[str, Any]:
+    async with GIT_SEM:
+        return await asyncio.to_thread(git_commit_all, args["message"])
 
-def tool_git_push(args: Dict[str, Any]) -> Dict[str, Any]:
+async def tool_git_push(args: Dict[str, Any]) -> Dict[str, Any]:
     remote = args.get("remote","origin")
     set_up = args.get("set_upstream", True)
     cmd = ["git","push"] + (["-u", remote, "HEAD"] if set_up else [remote, "HEAD"])
-    return run(cmd, cwd=PROJECT_ROOT)
+    async with GIT_SEM:
+        return await asyncio.to_thread(run, cmd, PROJECT_ROOT)
+
+async def tool_git_commit_push(args: Dict[str, Any]) -> Dict[str, Any]:
+    # branch + add + commit + push in a single shell process instead of one fork per step
+    branch, message, remote = (shlex.quote(v) for v in (args["branch"], args["message"], args.get("remote","origin")))
+    script = f"git checkout -B {branch} && git add -A && git commit -m {message} && git push -u {remote} HEAD"
+    async with GIT_SEM:
+        return await asyncio.to_thread(run, ["bash","-c", script], PROJECT_ROOT)
 
-def tool_github_create_pr(args: Dict[str, Any]) -> Dict[str, Any]:
-    import requests
+# one HTTP/2 client for all GitHub API calls, so PR creation and CI polling share a connection
+GITHUB = httpx.AsyncClient(base_url="https://api.github.com", http2=True, timeout=30, headers={"Accept": "application/vnd.github+json"})
+
+async def tool_github_create_pr(args: Dict[str, Any]) -> Dict[str, Any]:
     token = os.getenv("GITHUB_TOKEN")
     if not token:
         return {"ok": False, "error": "missing_GITHUB_TOKEN_env"}
     owner, repo, head, base, title = args["owner"], args["repo"], args["head"], args["base"], args["title"]
     body = args.get("body","")
-    url = f"https://api.github.com/repos/{owner}/{repo}/pulls"
-    headers = {"Authorization": f"Bearer {token}", "Accept": "application/vnd.github+json"}
-    resp = requests.post(url, headers=headers, json={"title": title, "head": head, "base": base, "body": body})
+    headers = {"Authorization": f"Bearer {token}"}
+    resp = await GITHUB.post(f"/repos/{owner}/{repo}/pulls", headers=headers, json={"title": title, "head": head, "base": base, "body": body})
     if resp.status_code >= 400:
         return {"ok": False, "status": resp.status_code, "resp": resp.text}
     data = resp.json()
@@ -140,18 +327,23 @@ def tool_checks_wait_for_ci(args: Dict[str, Any]) -> Dict[str, Any]:
 TOOLS = {
     "fs.read": tool_fs_read,
     "fs.write": tool_fs_write,
+    "fs.write_many": tool_fs_write_many,
     "tests.pytest": tool_tests_pytest,
     "git.branch": tool_git_branch,
     "git.commit": tool_git_commit,
     "git.push": tool_git_push,
+    "git.commit_push": tool_git_commit_push,
     "github.create_pr": tool_github_create_pr,
     "checks.wait_for_ci": tool_checks_wait_for_ci,
 }
 
+# name -> awaitable callable, built once: blocking tools are pre-wrapped to run on worker threads
+DISPATCH = {name: fn if inspect.iscoroutinefunction(fn) else partial(asyncio.to_thread, fn) for name, fn in TOOLS.items()}
+
 @app.post("/mcp")
 async def mcp_endpoint(request: Request):
-    payload = await request.json()
-    def handle(obj):
+    payload = orjson.loads(await request.body())
+    async def handle(obj):
         mid = obj.get("id")
         method = obj.get("method","")
         params = obj.get("params") or {}
@@ -160,40 +352,46 @@ async def mcp_endpoint(request: Request):
         if method == "tools/call":
             name = params.get("name")
             args = params.get("args") or {}
-            fn = TOOLS.get(name)
-            if not fn:
+            try:
+                call = DISPATCH[name]
+            except KeyError:
                 return {"jsonrpc":"2.0","id":mid,"error":{"code":-32601,"message":f"Unknown tool {name}"}}
             try:
-                out = fn(args)
+                out = await call(args)
                 return {"jsonrpc":"2.0","id":mid,"result":out}
             except Exception as e:
                 return {"jsonrpc":"2.0","id":mid,"error":{"code":-32000,"message":str(e)}}
         return {"jsonrpc":"2.0","id":mid,"error":{"code":-32601,"message":"Unknown method"}}
     if isinstance(payload, list):
-        return JSONResponse([handle(obj) for obj in payload])
+        return OrjsonResponse(await asyncio.gather(*(handle(obj) for obj in payload)))
     else:
-        return JSONResponse(handle(payload))
+        return OrjsonResponse(await handle(payload))
 # add POST to both manifests
 @app.api_route("/.well-known/mcp/manifest.json", methods=["GET", "HEAD", "OPTIONS", "POST"])
-def mcp_manifest():
-    return JSONResponse(MCP_MANIFEST)
+def mcp_manifest(request: Request):
+    return manifest_response(request)
 
 @app.api_route("/.well-known/manifest.json", methods=["GET", "HEAD", "OPTIONS", "POST"])
-def legacy_manifest():
-    return JSONResponse(MCP_MANIFEST)
+def legacy_manifest(request: Request):
+    return manifest_response(request)
 # add POST here (was only GET/HEAD/OPTIONS)
 @app.api_route("/.well-known/mcp/manifest.json",
                methods=["GET", "HEAD", "OPTIONS", "POST"])
-def mcp_manifest():
-    return JSONResponse(MCP_MANIFEST)
+def mcp_manifest(request: Request):
+    return manifest_response(request)
 
 # keep the legacy alias in sync
 @app.api_route("/.well-known/manifest.json",
                methods=["GET", "HEAD", "OPTIONS", "POST"])
-def legacy_manifest():
-    return JSONResponse(MCP_MANIFEST)
+def legacy_manifest(request: Request):
+    return manifest_response(request)
 
 if __name__ == "__main__":
     import uvicorn
+    try:
+        import uvloop  # noqa: F401  (no Windows support)
+        loop = "uvloop"
+    except ImportError:
+        loop = "asyncio"
     port = int(os.getenv("PORT","10000"))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    uvicorn.run(app, host="0.0.0.0", port=port, loop=loop, http="httptools", log_level="warning")